@@ -7,13 +7,18 @@ from flask_migrate import Migrate
 
 from config import (
     DATABASE_URL,
+    SQLALCHEMY_ENGINE_OPTIONS,
+    SQLALCHEMY_TRACK_MODIFICATIONS,
     SECRET_KEY,
+    ADMIN_PASSWORD_HASH_METHOD,
     UPLOAD_FOLDER,
     ALLOWED_EXTENSIONS,
-    MAX_CONTENT_LENGTH
+    MAX_CONTENT_LENGTH,
+    CACHE_TYPE,
+    CACHE_DEFAULT_TIMEOUT
 )
 
-from extension import db, login_manager
+from extension import db, login_manager, cache, ORJSONProvider
 from models import User
 
 # Import all blueprints
@@ -26,24 +31,34 @@ from blueprints.chatbot import chatbot_bp   # Chatbot Blueprint
 
 def create_app():
     app = Flask(__name__)
+    app.json = ORJSONProvider(app)
 
     # ------------------------------------
     # APP CONFIG
     # ------------------------------------
     app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
-    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = SQLALCHEMY_TRACK_MODIFICATIONS
+    # Pool sizing is for MySQL; SQLite (local/dev) keeps its own pool
+    if not DATABASE_URL.startswith("sqlite"):
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = SQLALCHEMY_ENGINE_OPTIONS
     app.config["SECRET_KEY"] = SECRET_KEY
+    app.config["ADMIN_PASSWORD_HASH_METHOD"] = ADMIN_PASSWORD_HASH_METHOD
 
     # 🔥 Upload / Image config (IMPORTANT)
     app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
     app.config["ALLOWED_EXTENSIONS"] = ALLOWED_EXTENSIONS
     app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
 
+    # Cache config
+    app.config["CACHE_TYPE"] = CACHE_TYPE
+    app.config["CACHE_DEFAULT_TIMEOUT"] = CACHE_DEFAULT_TIMEOUT
+
     # ------------------------------------
     # INITIALIZE EXTENSIONS
     # ------------------------------------
     db.init_app(app)
     login_manager.init_app(app)
+    cache.init_app(app)
 
     # Enable Flask-Migrate
     Migrate(app, db)
@@ -55,7 +70,9 @@ def create_app():
     # ------------------------------------
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        # Flask-Login calls this at most once per request and keeps the
+        # result on g; session.get() also checks the identity map first
+        return db.session.get(User, int(user_id))
 
     # ------------------------------------
     # UNAUTHORIZED HANDLER
@@ -2,27 +2,30 @@
 # pyright: ignore
 
 import os
-from io import BytesIO
+import shutil
+import hashlib
+import orjson
 from functools import wraps
 from datetime import datetime
 
 from flask import (
     Blueprint, render_template, request,
-    redirect, url_for, flash, Response, current_app
+    redirect, url_for, flash, current_app, send_file, jsonify, abort,
+    Response, stream_with_context
 )
 from flask_login import login_required, current_user
 from werkzeug.security import generate_password_hash
-from werkzeug.utils import secure_filename
-from sqlalchemy import func
+from sqlalchemy import func, select, insert, bindparam
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
 from models import User, Role, Book, BorrowRecord, BookRecommendation
-from extension import db
-
-# PDF
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from extension import db, cache
+from tasks import (
+    enqueue_full_report, report_status, report_path, enqueue_cover_mirror,
+    overdue_fines_stmt, REPORT_BATCH_SIZE
+)
+from catalog_cache import DASHBOARD_CACHE_KEY, invalidate_dashboard
 
 
 # =================================================
@@ -52,40 +55,113 @@ def admin_required(fn):
 # =================================================
 # FILE VALIDATION
 # =================================================
+_ALLOWED = None
+
+
 def allowed_file(filename):
-    return (
-        "." in filename and
-        filename.rsplit(".", 1)[1].lower()
-        in current_app.config["ALLOWED_EXTENSIONS"]
-    )
+    global _ALLOWED
+    if _ALLOWED is None:
+        _ALLOWED = frozenset(
+            ext.lower() for ext in current_app.config["ALLOWED_EXTENSIONS"]
+        )
+
+    _, dot, ext = filename.rpartition(".")
+    return bool(dot) and ext.lower() in _ALLOWED
+
+
+# Rows per page on the admin listings
+ADMIN_PAGE_SIZE = 50
+
+
+# Copy buffer for cover uploads
+COVER_CHUNK_SIZE = 1024 * 1024
+
+
+def save_cover(file):
+    """
+    Writes an uploaded cover into UPLOAD_FOLDER and returns its URL.
+    Files are named after a hash of their content, so re-uploading the
+    same image skips the write and different books never collide.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: file.stream.read(COVER_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.stream.seek(0)
+
+    ext = file.filename.rsplit(".", 1)[1].lower()
+    filename = f"{digest.hexdigest()}.{ext}"
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], filename)
+
+    if not os.path.exists(path):
+        with open(path, "wb") as dst:
+            shutil.copyfileobj(file.stream, dst, length=COVER_CHUNK_SIZE)
+
+    return f"/static/uploads/{filename}"
 
 
 # =================================================
 # DASHBOARD
 # =================================================
+# Built once at import; each call only binds "now", so SQLAlchemy reuses
+# the compiled form from its statement cache
+_COUNTERS_STMT = select(
+    select(func.count(Book.id)).scalar_subquery(),
+    select(
+        func.coalesce(func.sum(Book.copies_available), 0)
+    ).scalar_subquery(),
+    select(func.count(BorrowRecord.id)).where(
+        BorrowRecord.returned.is_(False)
+    ).scalar_subquery(),
+    select(func.count(BorrowRecord.id)).where(
+        BorrowRecord.overdue_filter(bindparam("now"))
+    ).scalar_subquery(),
+    select(func.count(BookRecommendation.id)).where(
+        BookRecommendation.status == "pending"
+    ).scalar_subquery()
+)
+
+_ROLE_COUNTS_STMT = select(User.role, func.count(User.id)).group_by(User.role)
+
+
+@cache.cached(timeout=60, key_prefix=DASHBOARD_CACHE_KEY)
+def dashboard_stats():
+    # All scalar counters in a single round trip
+    (
+        total_books,
+        total_available,
+        total_borrowed,
+        overdue,
+        pending_recommendations
+    ) = db.session.execute(
+        _COUNTERS_STMT, {"now": datetime.utcnow()}
+    ).one()
+
+    # Role breakdown in one GROUP BY
+    role_counts = dict(db.session.execute(_ROLE_COUNTS_STMT).all())
+
+    return {
+        "total_books": total_books,
+        "total_users": sum(role_counts.values()),
+        "total_available": total_available,
+        "total_borrowed": total_borrowed,
+        "overdue": overdue,
+        "admin_count": role_counts.get(Role.ADMIN, 0),
+        "teacher_count": role_counts.get(Role.TEACHER, 0),
+        "student_count": role_counts.get(Role.STUDENT, 0),
+        "pending_recommendations": pending_recommendations
+    }
+
+
 @admin_bp.route("/")
 @login_required
 @admin_required
 def dashboard():
     return render_template(
         "admin/dashboard.html",
-        total_books=Book.query.count(),
-        total_users=User.query.count(),
-        total_available=db.session.query(
-            func.coalesce(func.sum(Book.copies_available), 0)
-        ).scalar(),
-        total_borrowed=BorrowRecord.query.filter_by(returned=False).count(),
-        overdue=BorrowRecord.query.filter(
-            BorrowRecord.returned.is_(False),
-            BorrowRecord.due_date < datetime.utcnow()
-        ).count(),
-        admin_count=User.query.filter_by(role=Role.ADMIN).count(),
-        teacher_count=User.query.filter_by(role=Role.TEACHER).count(),
-        student_count=User.query.filter_by(role=Role.STUDENT).count(),
-        pending_recommendations=BookRecommendation.query.filter_by(
-            status="pending"
-        ).count(),
-        recent_recommendations=BookRecommendation.query.order_by(
+        **dashboard_stats(),
+        recent_recommendations=BookRecommendation.query.options(
+            selectinload(BookRecommendation.user)
+        ).order_by(
             BookRecommendation.date.desc()
         ).limit(5).all()
     )
@@ -98,14 +174,19 @@ def dashboard():
 @login_required
 @admin_required
 def recommendations():
+    recommendations = BookRecommendation.query.options(
+        selectinload(BookRecommendation.user)
+    ).order_by(
+        BookRecommendation.date.desc()
+    ).all()
+
+    # Counted from the list itself so the badge always matches it
     return render_template(
         "admin/recommendations.html",
-        recommendations=BookRecommendation.query.order_by(
-            BookRecommendation.date.desc()
-        ).all(),
-        pending_recommendations=BookRecommendation.query.filter_by(
-            status="pending"
-        ).count()
+        recommendations=recommendations,
+        pending_recommendations=sum(
+            rec.status == "pending" for rec in recommendations
+        )
     )
 
 
@@ -121,6 +202,7 @@ def update_recommendation_status(rec_id, action):
 
     rec.status = action
     db.session.commit()
+    invalidate_dashboard()
     flash(f"Recommendation {action}", "success")
     return redirect(url_for("admin.recommendations"))
 
@@ -132,9 +214,14 @@ def update_recommendation_status(rec_id, action):
 @login_required
 @admin_required
 def books():
+    page = request.args.get("page", 1, type=int)
+    pagination = Book.query.order_by(Book.title).paginate(
+        page=page, per_page=ADMIN_PAGE_SIZE, error_out=False
+    )
     return render_template(
         "admin/books.html",
-        books=Book.query.order_by(Book.title).all()
+        books=pagination.items,
+        pagination=pagination
     )
 
 
@@ -160,21 +247,18 @@ def add_book():
 
             # ---------------- COVER LOGIC ----------------
             cover_url = None
+            remote_cover = False
             file = request.files.get("cover_image")
 
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                path = os.path.join(
-                    current_app.config["UPLOAD_FOLDER"], filename
-                )
-                file.save(path)
-                cover_url = f"/static/uploads/{filename}"
+                cover_url = save_cover(file)
 
             elif isbn:
                 cover_url = (
                     f"https://covers.openlibrary.org/b/isbn/"
                     f"{isbn}-L.jpg?default=false"
                 )
+                remote_cover = True
 
             # ---------------- CREATE BOOK ----------------
             book = Book(
@@ -193,6 +277,12 @@ def add_book():
 
             db.session.add(book)
             db.session.commit()
+            invalidate_dashboard()
+
+            if remote_cover:
+                enqueue_cover_mirror(
+                    current_app._get_current_object(), book.id, cover_url
+                )
 
             flash("Book added successfully", "success")
             return redirect(url_for("admin.books"))
@@ -205,6 +295,59 @@ def add_book():
     return render_template("admin/add_book.html")
 
 
+@admin_bp.route("/books/bulk_add", methods=["POST"])
+@login_required
+@admin_required
+def bulk_add_books():
+    """
+    Accepts a JSON list of books and inserts them in one statement.
+    Titles that already exist are skipped, so an import can be re-run.
+    """
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, list):
+        return jsonify({"error": "Expected a JSON list of books"}), 400
+
+    try:
+        rows = []
+        for item in payload:
+            copies_total = int(item["copies_total"])
+            rows.append({
+                "isbn": item.get("isbn") or None,
+                "title": item["title"].strip(),
+                "author": item["author"].strip(),
+                "publisher": item["publisher"].strip(),
+                "year": int(item["year"]),
+                "copies_total": copies_total,
+                "copies_available": copies_total,
+                "category": item["category"].strip(),
+                "description": (item.get("description") or "")[:500],
+                "rating": int(item.get("rating") or 0)
+            })
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return jsonify({"error": "Invalid book data"}), 400
+
+    existing = {
+        title for (title,) in db.session.query(Book.title).filter(
+            Book.title.in_([r["title"] for r in rows])
+        )
+    }
+    rows = [r for r in rows if r["title"] not in existing]
+
+    if rows:
+        try:
+            db.session.execute(insert(Book), rows)
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return jsonify({"error": "Duplicate book details"}), 409
+        invalidate_dashboard()
+
+    return jsonify({
+        "inserted": len(rows),
+        "skipped": len(payload) - len(rows)
+    }), 201
+
+
 @admin_bp.route("/books/edit/<int:book_id>", methods=["GET", "POST"])
 @login_required
 @admin_required
@@ -225,20 +368,17 @@ def edit_book(book_id):
         book.rating = int(rating) if rating else 0
 
         # ---------- COVER LOGIC ----------
+        remote_cover = False
         file = request.files.get("cover_image")
         if file and file.filename and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            path = os.path.join(
-                current_app.config["UPLOAD_FOLDER"], filename
-            )
-            file.save(path)
-            book.cover_url = f"/static/uploads/{filename}"
+            book.cover_url = save_cover(file)
 
         elif isbn:
             book.cover_url = (
                 f"https://covers.openlibrary.org/b/isbn/"
                 f"{isbn}-L.jpg?default=false"
             )
+            remote_cover = True
 
         # ---------- COPIES ----------
         new_total = int(request.form["copies_total"])
@@ -247,6 +387,13 @@ def edit_book(book_id):
         book.copies_available = max(new_total - borrowed, 0)
 
         db.session.commit()
+        invalidate_dashboard()
+
+        if remote_cover:
+            enqueue_cover_mirror(
+                current_app._get_current_object(), book.id, book.cover_url
+            )
+
         flash("Book updated successfully", "success")
         return redirect(url_for("admin.books"))
 
@@ -259,14 +406,17 @@ def edit_book(book_id):
 def delete_book(book_id):
     book = Book.query.get_or_404(book_id)
 
-    if BorrowRecord.query.filter_by(
-        book_id=book.id, returned=False
-    ).count():
+    if db.session.query(
+        BorrowRecord.query.filter_by(
+            book_id=book.id, returned=False
+        ).exists()
+    ).scalar():
         flash("Cannot delete book. It is currently borrowed.", "danger")
         return redirect(url_for("admin.books"))
 
     db.session.delete(book)
     db.session.commit()
+    invalidate_dashboard()
     flash("Book deleted successfully", "success")
     return redirect(url_for("admin.books"))
 
@@ -278,9 +428,14 @@ def delete_book(book_id):
 @login_required
 @admin_required
 def users():
+    page = request.args.get("page", 1, type=int)
+    pagination = User.query.order_by(User.username).paginate(
+        page=page, per_page=ADMIN_PAGE_SIZE, error_out=False
+    )
     return render_template(
         "admin/users.html",
-        users=User.query.order_by(User.username).all()
+        users=pagination.items,
+        pagination=pagination
     )
 
 
@@ -289,10 +444,12 @@ def users():
 @admin_required
 def add_user():
     if request.method == "POST":
-        if User.query.filter(
-            (User.username == request.form["username"]) |
-            (User.email == request.form["email"])
-        ).first():
+        if db.session.query(
+            User.query.filter(
+                (User.username == request.form["username"]) |
+                (User.email == request.form["email"])
+            ).exists()
+        ).scalar():
             flash("User already exists", "danger")
             return redirect(url_for("admin.users"))
 
@@ -301,12 +458,14 @@ def add_user():
             email=request.form["email"].strip(),
             role=request.form["role"],
             password_hash=generate_password_hash(
-                request.form["password"]
+                request.form["password"],
+                method=current_app.config["ADMIN_PASSWORD_HASH_METHOD"]
             )
         )
 
         db.session.add(user)
         db.session.commit()
+        invalidate_dashboard()
         flash("User added successfully", "success")
         return redirect(url_for("admin.users"))
 
@@ -325,6 +484,7 @@ def delete_user(user_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_dashboard()
     flash("User deleted", "success")
     return redirect(url_for("admin.users"))
 
@@ -336,11 +496,17 @@ def delete_user(user_id):
 @login_required
 @admin_required
 def reports():
+    page = request.args.get("page", 1, type=int)
+    pagination = BorrowRecord.query.options(
+        selectinload(BorrowRecord.book),
+        selectinload(BorrowRecord.user)
+    ).order_by(
+        BorrowRecord.borrow_date.desc()
+    ).paginate(page=page, per_page=ADMIN_PAGE_SIZE, error_out=False)
     return render_template(
         "admin/reports.html",
-        borrowed_books=BorrowRecord.query.order_by(
-            BorrowRecord.borrow_date.desc()
-        ).all(),
+        borrowed_books=pagination.items,
+        pagination=pagination,
         current_date=datetime.utcnow()
     )
 
@@ -348,137 +514,107 @@ def reports():
 # -------------------------------------------------
 # EXPORT FULL REPORT (PDF)
 # -------------------------------------------------
-@admin_bp.route("/export/full-report/pdf")
+@admin_bp.route("/export/full-report/pdf", methods=["POST"])
 @login_required
 @admin_required
 def export_full_report_pdf():
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        rightMargin=30,
-        leftMargin=30,
-        topMargin=30,
-        bottomMargin=30
-    )
-
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(
-        Paragraph("📊 Library Full Detailed Report", styles["Title"])
-    )
-    elements.append(Spacer(1, 20))
-
-    # ---------------- USERS ----------------
-    elements.append(Paragraph("👥 Users", styles["Heading2"]))
-    elements.append(Spacer(1, 10))
-
-    for u in User.query.order_by(User.username).all():
-        elements.append(
-            Paragraph(
-                f"""
-                <b>Username:</b> {u.username}<br/>
-                <b>Email:</b> {u.email}<br/>
-                <b>Role:</b> {u.role}<br/>
-                <b>Joined:</b> {u.created_at.date()}
-                """,
-                styles["Normal"]
-            )
-        )
-        elements.append(Spacer(1, 12))
-
-    # ---------------- BOOKS ----------------
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph("📚 Books", styles["Heading2"]))
-    elements.append(Spacer(1, 10))
-
-    for b in Book.query.order_by(Book.title).all():
-        elements.append(
-            Paragraph(
-                f"""
-                <b>Title:</b> {b.title}<br/>
-                <b>Author:</b> {b.author}<br/>
-                <b>Publisher:</b> {b.publisher}<br/>
-                <b>Year:</b> {b.year}<br/>
-                <b>Category:</b> {b.category}<br/>
-                <b>Total Copies:</b> {b.copies_total}<br/>
-                <b>Available Copies:</b> {b.copies_available}
-                """,
-                styles["Normal"]
-            )
+    job_id = enqueue_full_report(current_app._get_current_object())
+    return jsonify({
+        "job_id": job_id,
+        "status_url": url_for(
+            "admin.export_full_report_status", job_id=job_id
         )
-        elements.append(Spacer(1, 12))
+    }), 202
 
-    # ---------------- BORROWED ----------------
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph("📖 Borrowed Books", styles["Heading2"]))
-    elements.append(Spacer(1, 10))
 
-    for br in BorrowRecord.query.order_by(
-        BorrowRecord.borrow_date.desc()
-    ).all():
-        status = "Returned" if br.returned else "Not Returned"
-        overdue = (
-            " (OVERDUE)"
-            if not br.returned and br.due_date < datetime.utcnow()
-            else ""
+@admin_bp.route("/export/full-report/status/<uuid:job_id>")
+@login_required
+@admin_required
+def export_full_report_status(job_id):
+    status = report_status(str(job_id))
+    if status is None:
+        return jsonify({"status": "unknown"}), 404
+
+    payload = {"status": status}
+    if status == "finished":
+        payload["download_url"] = url_for(
+            "admin.export_full_report_download", job_id=job_id
         )
+    return jsonify(payload)
 
-        elements.append(
-            Paragraph(
-                f"""
-                <b>Book:</b> {br.book.title}<br/>
-                <b>User:</b> {br.user.username}<br/>
-                <b>Borrowed On:</b> {br.borrow_date.date()}<br/>
-                <b>Due Date:</b> {br.due_date.date()}<br/>
-                <b>Status:</b> {status}{overdue}
-                """,
-                styles["Normal"]
-            )
-        )
-        elements.append(Spacer(1, 12))
 
-    # ---------------- FINES ----------------
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph("💰 Fines / Overdue List", styles["Heading2"]))
-    elements.append(Spacer(1, 10))
+@admin_bp.route("/export/full-report/download/<uuid:job_id>")
+@login_required
+@admin_required
+def export_full_report_download(job_id):
+    if report_status(str(job_id)) != "finished":
+        abort(404)
 
-    overdue_records = BorrowRecord.query.filter(
-        BorrowRecord.returned.is_(False),
-        BorrowRecord.due_date < datetime.utcnow()
-    ).all()
+    return send_file(
+        report_path(str(job_id)),
+        mimetype="application/pdf",
+        as_attachment=True,
+        download_name="library_full_detailed_report.pdf"
+    )
 
-    if not overdue_records:
-        elements.append(
-            Paragraph("No overdue fines 🎉", styles["Normal"])
-        )
-    else:
-        for o in overdue_records:
-            days_overdue = (datetime.utcnow() - o.due_date).days
-            fine_amount = days_overdue * 5
-
-            elements.append(
-                Paragraph(
-                    f"""
-                    <b>User:</b> {o.user.username}<br/>
-                    <b>Book:</b> {o.book.title}<br/>
-                    <b>Days Overdue:</b> {days_overdue}<br/>
-                    <b>Fine Amount:</b> ₹{fine_amount}
-                    """,
-                    styles["Normal"]
-                )
+
+@admin_bp.route("/export/full-report/stream")
+@login_required
+@admin_required
+def export_full_report_stream():
+    """
+    Same data as the PDF report as newline-delimited JSON, one row per
+    line, written out as the database yields it.
+    """
+    now = datetime.utcnow()
+
+    def rows(stmt):
+        return db.session.execute(
+            stmt.execution_options(
+                stream_results=True, yield_per=REPORT_BATCH_SIZE
             )
-            elements.append(Spacer(1, 12))
+        )
 
-    doc.build(elements)
-    buffer.seek(0)
+    def generate():
+        for username, email, role, joined in rows(
+            select(User.username, User.email, User.role, User.created_at)
+            .order_by(User.username)
+        ):
+            yield orjson.dumps({
+                "type": "user", "username": username, "email": email,
+                "role": role, "joined": joined
+            }) + b"\n"
+
+        for b in rows(
+            select(
+                Book.title, Book.author, Book.publisher, Book.year,
+                Book.category, Book.copies_total, Book.copies_available
+            ).order_by(Book.title)
+        ):
+            yield orjson.dumps({"type": "book", **b._asdict()}) + b"\n"
+
+        for title, username, borrowed, due, returned, overdue in rows(
+            select(
+                Book.title, User.username, BorrowRecord.borrow_date,
+                BorrowRecord.due_date, BorrowRecord.returned,
+                BorrowRecord.overdue_filter(now).label("overdue")
+            )
+            .select_from(BorrowRecord)
+            .join(User, User.id == BorrowRecord.user_id)
+            .join(Book, Book.id == BorrowRecord.book_id)
+            .order_by(BorrowRecord.borrow_date.desc())
+        ):
+            yield orjson.dumps({
+                "type": "borrow", "book": title, "user": username,
+                "borrowed_on": borrowed, "due_date": due,
+                "returned": bool(returned),
+                "overdue": bool(overdue)
+            }) + b"\n"
+
+        for f in rows(overdue_fines_stmt(now)):
+            yield orjson.dumps({"type": "fine", **f._asdict()}) + b"\n"
 
     return Response(
-        buffer,
-        mimetype="application/pdf",
-        headers={
-            "Content-Disposition":
-            "attachment; filename=library_full_detailed_report.pdf"
-        }
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson"
     )
@@ -6,6 +6,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from models import User, Role
 from extension import db
 from sqlalchemy import or_
+from catalog_cache import invalidate_dashboard
 
 auth_bp = Blueprint('auth', __name__, template_folder='templates/auth')
 
@@ -108,6 +109,7 @@ def register():
 
         db.session.add(new_user)
         db.session.commit()
+        invalidate_dashboard()
 
         flash("🎉 Registration successful! Please log in.", "success")
         return redirect(url_for('auth.login'))
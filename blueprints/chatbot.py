@@ -1,13 +1,25 @@
 # type: ignore
 # pyright: ignore
 
-from flask import Blueprint, request, jsonify
+import orjson
+from flask import Blueprint, Response, request, jsonify
 from flask_login import current_user
-from models import Book, BorrowRecord, User
-from fuzzywuzzy import fuzz
-from sqlalchemy import or_, func
-from datetime import datetime, date
+from models import Book, BorrowRecord, User, search_filter, limited_rows
+from rapidfuzz import fuzz, process, utils
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload, load_only
+from datetime import date
+from functools import lru_cache
 from extension import db
+from catalog_cache import (
+    total_books, total_users, total_borrow_records, active_borrows,
+    available_book_rows, category_titles
+)
+
+try:
+    import ahocorasick
+except ImportError:  # optional; falls back to plain substring checks
+    ahocorasick = None
 
 chatbot_bp = Blueprint("chatbot_bp", __name__)
 
@@ -46,26 +58,99 @@ INTENT_KEYWORDS = {
     "greeting": ["hi", "hello", "hey", "help"]
 }
 
+# Categories the bot can browse and recommend from, in match priority
+CATEGORIES = ("ai", "programming", "databases", "cloud", "security", "software")
+
 FUZZY_THRESHOLD = 70
 
+# Distinct normalized messages whose intent is remembered
+INTENT_CACHE_SIZE = 1024
+
+# Most rows listed in a single reply
+CHATBOT_LIST_LIMIT = 50
+TEACHER_REPORT_LIMIT = 200
+
+# Flattened once, first intent wins for a keyword listed twice ("due date").
+# Keywords are already lowercase alphanumerics, i.e. what
+# utils.default_process would turn them into.
+DIRECT_LOOKUP = {}
+for _intent, _kws in INTENT_KEYWORDS.items():
+    for _kw in _kws:
+        DIRECT_LOOKUP.setdefault(_kw, _intent)
+
+# CHOICES[i] is KEYWORDS[i][0]
+KEYWORDS = tuple(DIRECT_LOOKUP.items())
+CHOICES = tuple(DIRECT_LOOKUP)
+
+
+INTENT_HIT, CATEGORY_HIT = 0, 1
+
+
+def _build_automaton():
+    """
+    Aho-Corasick automaton over every keyword and category name, so intent
+    and category come out of a single pass over the message. Values are
+    (kind, position, name); per kind the lowest position wins, which keeps
+    the order precedence of the plain loops.
+    """
+    if ahocorasick is None:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for priority, (kw, intent) in enumerate(KEYWORDS):
+        automaton.add_word(kw, (INTENT_HIT, priority, intent))
+    for priority, category in enumerate(CATEGORIES):
+        if not automaton.exists(category):
+            automaton.add_word(category, (CATEGORY_HIT, priority, category))
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_automaton()
+
 
 # -------------------------------
 # Intent Detection
 # -------------------------------
 def detect_intent(text: str):
-    t = text.lower().strip()
+    """
+    Returns (intent, category); either may be None.
+    """
+    # Normalized once here; "How many  Books?" and "how many books" share
+    # one cache entry and the scorers below skip their own processing.
+    return _detect_intent(" ".join(utils.default_process(text).split()))
+
 
+@lru_cache(maxsize=INTENT_CACHE_SIZE)
+def _detect_intent(t: str):
     # direct keyword match
-    for intent, keywords in INTENT_KEYWORDS.items():
-        for k in keywords:
+    if KEYWORD_AUTOMATON is not None:
+        hits = ([], [])
+        for _, (kind, priority, name) in KEYWORD_AUTOMATON.iter(t):
+            hits[kind].append((priority, name))
+        intents, categories = hits
+        category = min(categories)[1] if categories else None
+        if intents:
+            return min(intents)[1], category
+    else:
+        category = next((c for c in CATEGORIES if c in t), None)
+        for k, intent in KEYWORDS:
             if k in t:
-                return intent
+                return intent, category
+
+    return _fuzzy_intent(t), category
 
-    # fuzzy match
-    for intent, keywords in INTENT_KEYWORDS.items():
-        for k in keywords:
-            if fuzz.partial_ratio(t, k) >= FUZZY_THRESHOLD:
-                return intent
+
+def _fuzzy_intent(t: str):
+    # fuzzy match (best keyword wins)
+    match = process.extractOne(
+        t, CHOICES,
+        scorer=fuzz.partial_ratio,
+        processor=None,
+        score_cutoff=FUZZY_THRESHOLD
+    )
+    if match:
+        return KEYWORDS[match[2]][1]
 
     # fallback heuristics
     if "user" in t or "member" in t:
@@ -78,6 +163,71 @@ def detect_intent(text: str):
     return None
 
 
+# Words that ask for a search without saying what to search for
+SEARCH_STOPWORDS = frozenset({
+    "search", "find", "look", "for", "book", "books", "about",
+    "the", "a", "an", "me"
+})
+
+
+def search_keyword(text: str):
+    """
+    Last word of the message that is not a search stopword, or None
+    for a bare "search" / "find book".
+    """
+    tokens = [w for w in text.split() if w.lower() not in SEARCH_STOPWORDS]
+    return tokens[-1] if tokens else None
+
+
+# -------------------------------
+# Pre-rendered Replies
+# -------------------------------
+# Fixed replies are encoded once at import; each request only wraps the
+# bytes in a fresh Response.
+def _prerender(reply):
+    return orjson.dumps({"reply": reply})
+
+
+def _send(payload):
+    return Response(payload, mimetype="application/json")
+
+
+def _more_line(more):
+    # closing line for a list reply cut at its limit
+    return f"…and {more} more<br>" if more else ""
+
+
+EMPTY_MESSAGE_REPLY = _prerender(
+    "Please ask a question (e.g. 'How many books?' or 'Suggest me a book')."
+)
+
+GREETING_REPLY = _prerender(
+    "Hello 👋 I can help you with:<br>"
+    "• Searching books<br>"
+    "• Borrowed books & due dates<br>"
+    "• Fines & overdue books<br>"
+    "• Book recommendations<br>"
+    "• Library statistics (Admin / Teacher)"
+)
+
+DEFAULT_REPLY = _prerender(
+    "<b>I can help with:</b><br>"
+    "• Searching books<br>"
+    "• Book recommendations<br>"
+    "• Borrowed books & due dates<br>"
+    "• Fines & overdue books<br>"
+    "• Library statistics"
+)
+
+LOGIN_BORROWED_REPLY = _prerender("Please log in to check your borrowed books.")
+LOGIN_DUE_DATE_REPLY = _prerender("Please log in to check due dates.")
+LOGIN_FINES_REPLY = _prerender("Please log in to check fines.")
+LOGIN_OVERDUE_REPLY = _prerender("Please log in to check overdue books.")
+ADMIN_REQUIRED_REPLY = _prerender("⚠️ Admin access required.")
+TEACHER_REQUIRED_REPLY = _prerender("⚠️ Teacher access required.")
+SEARCH_PROMPT_REPLY = _prerender("What book are you looking for?")
+
+
 # -------------------------------
 # Chatbot API
 # -------------------------------
@@ -85,149 +235,170 @@ def detect_intent(text: str):
 def chatbot_api():
     msg = request.json.get("message", "").strip()
     if not msg:
-        return jsonify({"reply": "Please ask a question (e.g. 'How many books?' or 'Suggest me a book')."})
+        return _send(EMPTY_MESSAGE_REPLY)
 
-    intent = detect_intent(msg)
+    intent, category = detect_intent(msg)
 
     # -------------------------------
     # Greetings
     # -------------------------------
     if intent == "greeting":
-        return jsonify({
-            "reply":
-            "Hello 👋 I can help you with:<br>"
-            "• Searching books<br>"
-            "• Borrowed books & due dates<br>"
-            "• Fines & overdue books<br>"
-            "• Book recommendations<br>"
-            "• Library statistics (Admin / Teacher)"
-        })
+        return _send(GREETING_REPLY)
 
     # -------------------------------
     # Counts
     # -------------------------------
     if intent == "count_books":
-        return jsonify({"reply": f"There are <b>{Book.query.count()}</b> books in the library."})
+        return jsonify({"reply": f"There are <b>{total_books()}</b> books in the library."})
 
     if intent == "count_users":
-        return jsonify({"reply": f"There are <b>{User.query.count()}</b> registered users."})
+        return jsonify({"reply": f"There are <b>{total_users()}</b> registered users."})
 
     if intent == "count_borrowed":
-        total = BorrowRecord.query.count()
+        total = total_borrow_records()
         return jsonify({"reply": f"There are <b>{total}</b> borrow records."})
 
     # -------------------------------
     # Available Books
     # -------------------------------
     if intent == "available_books":
-        books = Book.query.filter(Book.copies_available > 0).all()
+        books, more = available_book_rows(CHATBOT_LIST_LIMIT)
         if not books:
             return jsonify({"reply": "No books are currently available."})
 
-        reply = "<b>Available books:</b><br>"
-        for b in books:
-            reply += f"• {b.title} ({b.copies_available} copies)<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>Available books:</b><br>"]
+        parts.extend(f"• {title} ({copies} copies)<br>" for title, copies in books)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Search Books
     # -------------------------------
     if intent == "search_book":
-        words = msg.split()
-        keyword = words[-1]
-
-        books = Book.query.filter(
-            or_(
-                Book.title.ilike(f"%{keyword}%"),
-                Book.author.ilike(f"%{keyword}%")
-            )
-        ).all()
+        keyword = search_keyword(msg)
+        if keyword is None:
+            return _send(SEARCH_PROMPT_REPLY)
+
+        books, more = limited_rows(
+            Book.query.options(
+                load_only(Book.title, Book.author)
+            ).filter(
+                search_filter(keyword, Book.title, Book.author)
+            ).order_by(Book.title, Book.id),
+            CHATBOT_LIST_LIMIT
+        )
 
         if not books:
             return jsonify({"reply": f"No books found for '<b>{keyword}</b>'."})
 
-        reply = "<b>Books found:</b><br>"
-        for b in books:
-            reply += f"• {b.title} by {b.author}<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>Books found:</b><br>"]
+        parts.extend(f"• {b.title} by {b.author}<br>" for b in books)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Books by Author
     # -------------------------------
     if intent == "books_by_author":
         author = msg.split("by")[-1].strip()
-        books = Book.query.filter(Book.author.ilike(f"%{author}%")).all()
+        books, more = limited_rows(
+            Book.query.options(
+                load_only(Book.title, Book.year)
+            ).filter(
+                Book.author.ilike(f"%{author}%")
+            ).order_by(Book.title, Book.id),
+            CHATBOT_LIST_LIMIT
+        )
 
         if not books:
             return jsonify({"reply": f"No books found by <b>{author}</b>."})
 
-        reply = f"<b>Books by {author}:</b><br>"
-        for b in books:
-            reply += f"• {b.title} ({b.year})<br>"
-        return jsonify({"reply": reply})
+        parts = [f"<b>Books by {author}:</b><br>"]
+        parts.extend(f"• {b.title} ({b.year})<br>" for b in books)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Books by Category
     # -------------------------------
     if intent == "books_by_category":
-        categories = ["ai", "programming", "databases", "cloud", "security", "software"]
-        found = next((c for c in categories if c in msg.lower()), None)
+        found = category
 
         if not found:
             return jsonify({"reply": "Please specify a category (e.g. AI, Programming, Databases)."})
 
-        books = Book.query.filter(Book.category.ilike(f"%{found}%")).all()
-        if not books:
+        titles, more = category_titles(found, CHATBOT_LIST_LIMIT)
+        if not titles:
             return jsonify({"reply": f"No books found in <b>{found}</b> category."})
 
-        reply = f"<b>{found.title()} books:</b><br>"
-        for b in books:
-            reply += f"• {b.title}<br>"
-        return jsonify({"reply": reply})
+        parts = [f"<b>{found.title()} books:</b><br>"]
+        parts.extend(f"• {title}<br>" for title in titles)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # My Borrowed Books
     # -------------------------------
     if intent == "my_borrowed":
         if not current_user.is_authenticated:
-            return jsonify({"reply": "Please log in to check your borrowed books."})
-
-        records = BorrowRecord.query.filter_by(user_id=current_user.id).all()
+            return _send(LOGIN_BORROWED_REPLY)
+
+        # most recent borrows first
+        records, more = limited_rows(
+            BorrowRecord.query.options(
+                selectinload(BorrowRecord.book).load_only(Book.title)
+            ).filter_by(user_id=current_user.id).order_by(
+                BorrowRecord.borrow_date.desc(), BorrowRecord.id.desc()
+            ),
+            CHATBOT_LIST_LIMIT
+        )
         if not records:
             return jsonify({"reply": "You have not borrowed any books."})
 
-        reply = "<b>Your borrowed books:</b><br>"
+        today = date.today()
+        parts = ["<b>Your borrowed books:</b><br>"]
         for r in records:
             status = "Returned" if r.returned else (
-                "Overdue" if r.due_date and r.due_date.date() < date.today() else "Borrowed"
+                "Overdue" if r.due_date and r.due_date.date() < today else "Borrowed"
             )
-            reply += f"• {r.book.title} ({status})<br>"
-        return jsonify({"reply": reply})
+            parts.append(f"• {r.book.title} ({status})<br>")
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Due Dates
     # -------------------------------
     if intent == "my_due_date":
         if not current_user.is_authenticated:
-            return jsonify({"reply": "Please log in to check due dates."})
-
-        records = BorrowRecord.query.filter_by(user_id=current_user.id, returned=False).all()
+            return _send(LOGIN_DUE_DATE_REPLY)
+
+        # earliest due first
+        records, more = limited_rows(
+            BorrowRecord.query.options(
+                selectinload(BorrowRecord.book).load_only(Book.title)
+            ).filter_by(
+                user_id=current_user.id, returned=False
+            ).order_by(BorrowRecord.due_date, BorrowRecord.id),
+            CHATBOT_LIST_LIMIT
+        )
         if not records:
             return jsonify({"reply": "You have no active borrowed books."})
 
-        reply = "<b>Your due dates:</b><br>"
-        for r in records:
-            reply += f"• {r.book.title}: {r.due_date.date()}<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>Your due dates:</b><br>"]
+        parts.extend(f"• {r.book.title}: {r.due_date.date()}<br>" for r in records)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Fines
     # -------------------------------
     if intent == "check_fines":
         if not current_user.is_authenticated:
-            return jsonify({"reply": "Please log in to check fines."})
+            return _send(LOGIN_FINES_REPLY)
 
-        total = sum(r.fine or 0 for r in BorrowRecord.query.filter_by(user_id=current_user.id))
+        total = db.session.query(
+            func.coalesce(func.sum(BorrowRecord.fine), 0)
+        ).filter(BorrowRecord.user_id == current_user.id).scalar()
         return jsonify({"reply": f"Your total fine is <b>₹{total}</b>."})
 
     # -------------------------------
@@ -235,58 +406,62 @@ def chatbot_api():
     # -------------------------------
     if intent == "overdue":
         if not current_user.is_authenticated:
-            return jsonify({"reply": "Please log in to check overdue books."})
-
-        overdue = BorrowRecord.query.filter(
-            BorrowRecord.user_id == current_user.id,
-            BorrowRecord.returned == False,
-            BorrowRecord.due_date < datetime.utcnow()
-        ).all()
+            return _send(LOGIN_OVERDUE_REPLY)
+
+        # longest overdue first
+        overdue, more = limited_rows(
+            BorrowRecord.query.options(
+                selectinload(BorrowRecord.book).load_only(Book.title)
+            ).filter(
+                BorrowRecord.user_id == current_user.id,
+                BorrowRecord.overdue_filter(date.today())
+            ).order_by(BorrowRecord.due_date, BorrowRecord.id),
+            CHATBOT_LIST_LIMIT
+        )
 
         if not overdue:
             return jsonify({"reply": "You have no overdue books."})
 
-        reply = "<b>Your overdue books:</b><br>"
-        for r in overdue:
-            reply += f"• {r.book.title} — Fine: ₹{r.fine}<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>Your overdue books:</b><br>"]
+        parts.extend(f"• {r.book.title} — Fine: ₹{r.fine}<br>" for r in overdue)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Recommendation
     # -------------------------------
     if intent == "recommend_book":
-        categories = ["ai", "programming", "databases", "cloud", "security", "software"]
-        preferred = next((c for c in categories if c in msg.lower()), None)
+        preferred = category
+        books_query = Book.query.options(load_only(Book.title, Book.author))
 
         if preferred:
-            books = Book.query.filter(
+            books = books_query.filter(
                 Book.category.ilike(f"%{preferred}%"),
                 Book.copies_available > 0
             ).limit(5).all()
         else:
-            books = Book.query.filter(Book.copies_available > 0).limit(5).all()
+            books = books_query.filter(Book.copies_available > 0).limit(5).all()
 
         if not books:
             return jsonify({"reply": "No books available for recommendation."})
 
-        reply = "<b>📚 Recommended books:</b><br>"
-        for b in books:
-            reply += f"• {b.title} by {b.author}<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>📚 Recommended books:</b><br>"]
+        parts.extend(f"• {b.title} by {b.author}<br>" for b in books)
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Admin Stats
     # -------------------------------
     if intent == "admin_stats":
         if not current_user.is_authenticated or not current_user.is_admin():
-            return jsonify({"reply": "⚠️ Admin access required."})
+            return _send(ADMIN_REQUIRED_REPLY)
 
         return jsonify({
             "reply":
             "<b>📊 Library Statistics:</b><br>"
-            f"• Total Books: {Book.query.count()}<br>"
-            f"• Total Users: {User.query.count()}<br>"
-            f"• Active Borrows: {BorrowRecord.query.filter_by(returned=False).count()}"
+            f"• Total Books: {total_books()}<br>"
+            f"• Total Users: {total_users()}<br>"
+            f"• Active Borrows: {active_borrows()}"
         })
 
     # -------------------------------
@@ -294,26 +469,26 @@ def chatbot_api():
     # -------------------------------
     if intent == "teacher_report":
         if not current_user.is_authenticated or not current_user.is_teacher():
-            return jsonify({"reply": "⚠️ Teacher access required."})
-
-        records = BorrowRecord.query.filter_by(returned=False).all()
-        if not records:
+            return _send(TEACHER_REQUIRED_REPLY)
+
+        rows, more = limited_rows(
+            db.session.query(User.username, Book.title)
+            .select_from(BorrowRecord)
+            .join(User, User.id == BorrowRecord.user_id)
+            .join(Book, Book.id == BorrowRecord.book_id)
+            .filter(BorrowRecord.returned == False)
+            .order_by(User.username, Book.title, BorrowRecord.id),
+            TEACHER_REPORT_LIMIT
+        )
+        if not rows:
             return jsonify({"reply": "No active borrow records."})
 
-        reply = "<b>📋 Students currently borrowing:</b><br>"
-        for r in records:
-            reply += f"• {r.user.username} → {r.book.title}<br>"
-        return jsonify({"reply": reply})
+        parts = ["<b>📋 Students currently borrowing:</b><br>"]
+        parts.extend(f"• {username} → {title}<br>" for username, title in rows)
+        parts.append(_more_line(more))
+        return jsonify({"reply": "".join(parts)})
 
     # -------------------------------
     # Default
     # -------------------------------
-    return jsonify({
-        "reply":
-        "<b>I can help with:</b><br>"
-        "• Searching books<br>"
-        "• Book recommendations<br>"
-        "• Borrowed books & due dates<br>"
-        "• Fines & overdue books<br>"
-        "• Library statistics"
-    })
+    return _send(DEFAULT_REPLY)
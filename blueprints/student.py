@@ -3,10 +3,14 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from functools import wraps
-from models import Role, Book, BorrowRecord
+from models import (
+    Role, Book, BorrowRecord, BOOK_CARD_COLUMNS, days_between, search_filter
+)
 from extension import db
-from datetime import datetime, date, timedelta, timezone
-from sqlalchemy import func
+from datetime import date, timedelta, timezone
+from sqlalchemy import func, select, case, update
+from sqlalchemy.orm import selectinload, load_only
+from catalog_cache import invalidate_dashboard
 
 # ----------------------------
 # Blueprint
@@ -18,6 +22,8 @@ student_bp = Blueprint(
     template_folder='templates/student'
 )
 
+BOOKS_PER_PAGE = 50
+
 # ----------------------------
 # Student role decorator
 # ----------------------------
@@ -31,19 +37,6 @@ def student_required(fn):
     return wrapper
 
 
-# ----------------------------
-# Utility: Safe date converter
-# ----------------------------
-def to_date(value):
-    """
-    Converts datetime -> date safely.
-    Works with old DB data and new Date columns.
-    """
-    if isinstance(value, datetime):
-        return value.date()
-    return value
-
-
 # ----------------------------
 # Dashboard
 # ----------------------------
@@ -53,18 +46,16 @@ def to_date(value):
 def dashboard():
     today = date.today()
 
-    total_books = Book.query.count()
-
-    borrowed_books = BorrowRecord.query.filter_by(
-        user_id=current_user.id,
-        returned=False
-    ).count()
-
-    overdue_books = BorrowRecord.query.filter(
-        BorrowRecord.user_id == current_user.id,
-        BorrowRecord.returned == False,
-        func.date(BorrowRecord.due_date) < today
-    ).count()
+    # All three counters in one round trip
+    total_books, borrowed_books, overdue_books = db.session.execute(
+        select(
+            select(func.count(Book.id)).scalar_subquery(),
+            func.count(case((BorrowRecord.returned == False, 1))),
+            func.count(case((BorrowRecord.overdue_filter(today), 1)))
+        )
+        .select_from(BorrowRecord)
+        .where(BorrowRecord.user_id == current_user.id)
+    ).one()
 
     return render_template(
         'student/dashboard.html',
@@ -83,29 +74,36 @@ def dashboard():
 def books():
     query = request.args.get('q', '').strip()
     selected_category = request.args.get('category', '').strip()
+    page = request.args.get('page', 1, type=int)
 
-    books_query = Book.query
+    books_query = Book.query.options(load_only(*BOOK_CARD_COLUMNS))
 
     if query:
         books_query = books_query.filter(
-            Book.title.ilike(f'%{query}%') |
-            Book.author.ilike(f'%{query}%') |
-            Book.category.ilike(f'%{query}%')
+            search_filter(query, Book.title, Book.author, Book.category)
         )
 
     if selected_category:
         books_query = books_query.filter(Book.category == selected_category)
 
-    all_books = books_query.all()
+    # Book.id breaks title ties so every page is stable
+    pagination = books_query.order_by(Book.title, Book.id).paginate(
+        page=page, per_page=BOOKS_PER_PAGE, error_out=False
+    )
+
+    categories = db.session.query(Book.category).distinct().all()
+    categories = [c[0] for c in categories if c[0]]
 
     categorized_books = {}
-    for book in all_books:
+    for book in pagination.items:
         category = book.category or "Others"
         categorized_books.setdefault(category, []).append(book)
 
     return render_template(
         'student/books.html',
         categorized_books=categorized_books,
+        categories=categories,
+        books=pagination,
         query=query,
         selected_category=selected_category
     )
@@ -118,35 +116,42 @@ def books():
 @login_required
 @student_required
 def borrow_book(book_id):
-    book = Book.query.get_or_404(book_id)
-
-    if book.copies_available <= 0:
-        flash('Book not available for borrowing!', 'danger')
+    if db.session.query(
+        BorrowRecord.query.filter_by(
+            user_id=current_user.id,
+            book_id=book_id,
+            returned=False
+        ).exists()
+    ).scalar():
+        flash('You already borrowed this book!', 'warning')
         return redirect(url_for('student.books'))
 
-    existing = BorrowRecord.query.filter_by(
-        user_id=current_user.id,
-        book_id=book_id,
-        returned=False
-    ).first()
+    # Take a copy in one conditional UPDATE so concurrent borrows
+    # cannot push copies_available below zero
+    taken = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.copies_available > 0)
+        .values(copies_available=Book.copies_available - 1)
+    ).rowcount
 
-    if existing:
-        flash('You already borrowed this book!', 'warning')
+    if not taken:
+        db.get_or_404(Book, book_id)
+        flash('Book not available for borrowing!', 'danger')
         return redirect(url_for('student.books'))
 
     today = date.today()
 
     borrow = BorrowRecord(
         user_id=current_user.id,
-        book_id=book.id,
+        book_id=book_id,
         borrow_date=today,
         due_date=today + timedelta(days=7),
         returned=False
     )
 
-    book.copies_available -= 1
     db.session.add(borrow)
     db.session.commit()
+    invalidate_dashboard()
 
     flash('Book borrowed successfully!', 'success')
     return redirect(url_for('student.borrowed_books'))
@@ -171,9 +176,14 @@ def return_book(record_id):
 
     record.returned = True
     record.return_date = date.today()
-    record.book.copies_available += 1
+    db.session.execute(
+        update(Book)
+        .where(Book.id == record.book_id)
+        .values(copies_available=Book.copies_available + 1)
+    )
 
     db.session.commit()
+    invalidate_dashboard()
 
     flash('Book returned successfully!', 'success')
     return redirect(url_for('student.borrowed_books'))
@@ -186,7 +196,9 @@ def return_book(record_id):
 @login_required
 @student_required
 def borrowed_books():
-    records = BorrowRecord.query.filter_by(
+    records = BorrowRecord.query.options(
+        selectinload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id
     ).order_by(BorrowRecord.borrow_date.desc()).all()
 
@@ -206,18 +218,19 @@ def borrowed_books():
 @login_required
 @student_required
 def fines():
-    records = BorrowRecord.query.filter_by(user_id=current_user.id).all()
-
-    fine_total = 0
     fine_per_day = 5
-    today = date.today()
+    # Evaluated once by the database, so both predicates see one constant
+    today = func.current_date()
 
-    for r in records:
-        due = to_date(r.due_date)
+    # Days late summed by the database over unreturned, past-due books
+    days_late = db.session.query(
+        func.coalesce(func.sum(days_between(BorrowRecord.due_date, today)), 0)
+    ).filter(
+        BorrowRecord.user_id == current_user.id,
+        BorrowRecord.overdue_filter(today)
+    ).scalar()
 
-        if not r.returned and due and due < today:
-            days_late = (today - due).days
-            fine_total += days_late * fine_per_day
+    fine_total = days_late * fine_per_day
 
     return render_template(
         'student/fines.html',
@@ -4,8 +4,14 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash
 from flask_login import login_required, current_user
 from functools import wraps
 from extension import db
-from models import User, Role, Book, BorrowRecord, BookRecommendation
+from models import (
+    User, Role, Book, BorrowRecord, BookRecommendation, BOOK_CARD_COLUMNS,
+    search_filter
+)
 from datetime import datetime, timedelta
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import selectinload, contains_eager, load_only
+from catalog_cache import invalidate_dashboard
 
 # ✅ Use default templates folder (Flask already knows "templates/")
 teacher_bp = Blueprint('teacher', __name__)
@@ -30,9 +36,19 @@ def teacher_required(fn):
 @login_required
 @teacher_required
 def dashboard():
-    total_books = Book.query.count()
-    borrowed_books = BorrowRecord.query.filter_by(user_id=current_user.id, returned=False).count()
-    recommended_books = BookRecommendation.query.filter_by(user_id=current_user.id).count()
+    # All three counters in one round trip
+    total_books, borrowed_books, recommended_books = db.session.execute(
+        select(
+            select(func.count(Book.id)).scalar_subquery(),
+            select(func.count(BorrowRecord.id)).where(
+                BorrowRecord.user_id == current_user.id,
+                BorrowRecord.returned.is_(False)
+            ).scalar_subquery(),
+            select(func.count(BookRecommendation.id)).where(
+                BookRecommendation.user_id == current_user.id
+            ).scalar_subquery()
+        )
+    ).one()
 
     return render_template(
         'teacher/dashboard.html',
@@ -53,18 +69,20 @@ def books():
     selected_category = request.args.get('category', '').strip()
     page = request.args.get('page', 1, type=int)
 
-    books_query = Book.query
+    books_query = Book.query.options(load_only(*BOOK_CARD_COLUMNS))
 
     if query:
         books_query = books_query.filter(
-            Book.title.ilike(f'%{query}%') |
-            Book.author.ilike(f'%{query}%')
+            search_filter(query, Book.title, Book.author)
         )
 
     if selected_category:
         books_query = books_query.filter(Book.category == selected_category)
 
-    pagination = books_query.paginate(page=page, per_page=6, error_out=False)
+    # Book.id breaks title ties so every page is stable
+    pagination = books_query.order_by(Book.title, Book.id).paginate(
+        page=page, per_page=6, error_out=False
+    )
 
     categories = db.session.query(Book.category).distinct().all()
     categories = [c[0] for c in categories if c[0]]
@@ -90,33 +108,42 @@ def books():
 @login_required
 @teacher_required
 def borrow_book(book_id):
-    book = Book.query.get_or_404(book_id)
-
-    if book.copies_available <= 0:
-        flash('This book is currently unavailable!', 'danger')
+    if db.session.query(
+        BorrowRecord.query.filter_by(
+            user_id=current_user.id,
+            book_id=book_id,
+            returned=False
+        ).exists()
+    ).scalar():
+        flash('You already borrowed this book.', 'warning')
         return redirect(url_for('teacher.books'))
 
-    existing = BorrowRecord.query.filter_by(
-        user_id=current_user.id,
-        book_id=book_id,
-        returned=False
-    ).first()
+    # Take a copy in one conditional UPDATE so concurrent borrows
+    # cannot push copies_available below zero
+    taken = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.copies_available > 0)
+        .values(copies_available=Book.copies_available - 1)
+    ).rowcount
 
-    if existing:
-        flash('You already borrowed this book.', 'warning')
+    if not taken:
+        db.get_or_404(Book, book_id)
+        flash('This book is currently unavailable!', 'danger')
         return redirect(url_for('teacher.books'))
 
+    now = datetime.utcnow()
+
     borrow = BorrowRecord(
         user_id=current_user.id,
-        book_id=book.id,
-        borrow_date=datetime.utcnow(),
-        due_date=datetime.utcnow() + timedelta(days=14),
+        book_id=book_id,
+        borrow_date=now,
+        due_date=now + timedelta(days=14),
         returned=False
     )
 
-    book.copies_available -= 1
     db.session.add(borrow)
     db.session.commit()
+    invalidate_dashboard()
 
     flash('Book borrowed successfully!', 'success')
     return redirect(url_for('teacher.borrowed_books'))
@@ -137,8 +164,13 @@ def return_book(record_id):
 
     record.returned = True
     record.return_date = datetime.utcnow()
-    record.book.copies_available += 1
+    db.session.execute(
+        update(Book)
+        .where(Book.id == record.book_id)
+        .values(copies_available=Book.copies_available + 1)
+    )
     db.session.commit()
+    invalidate_dashboard()
 
     flash('Book returned successfully!', 'success')
     return redirect(url_for('teacher.borrowed_books'))
@@ -152,7 +184,8 @@ def return_book(record_id):
 @teacher_required
 def borrowed_books():
     records = (
-        BorrowRecord.query.filter_by(user_id=current_user.id)
+        BorrowRecord.query.options(selectinload(BorrowRecord.book))
+        .filter_by(user_id=current_user.id)
         .order_by(BorrowRecord.borrow_date.desc())
         .all()
     )
@@ -184,6 +217,7 @@ def recommend_book():
         )
         db.session.add(recommendation)
         db.session.commit()
+        invalidate_dashboard()
 
         flash('Book recommendation sent to the admin.', 'success')
         return redirect(url_for('teacher.recommend_book'))
@@ -205,6 +239,10 @@ def recommend_book():
 def reports():
     borrowed_books = (
         BorrowRecord.query.join(User)
+        .options(
+            contains_eager(BorrowRecord.user),
+            selectinload(BorrowRecord.book)
+        )
         .filter(User.role == Role.STUDENT)
         .order_by(BorrowRecord.borrow_date.desc())
         .all()
@@ -0,0 +1,79 @@
+# catalog_cache.py
+# type: ignore
+# pyright: ignore
+
+from extension import cache
+from models import Book, BorrowRecord, User, limited_rows
+
+
+# =================================================
+# CATALOGUE COUNTERS
+# =================================================
+# Catalogue-wide answers are identical for every user and only change on
+# book/user/borrow writes, so they are memoized and dropped on those writes
+# via invalidate_catalog_cache(). Only plain values are cached, never ORM
+# instances, so nothing is bound to a finished session.
+CATALOG_CACHE_TIMEOUT = 60
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def total_books():
+    return Book.query.count()
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def total_users():
+    return User.query.count()
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def total_borrow_records():
+    return BorrowRecord.query.count()
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def active_borrows():
+    return BorrowRecord.query.filter_by(returned=False).count()
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def available_book_rows(limit):
+    """([(title, copies_available), ...] by title, count left out)."""
+    rows, more = limited_rows(
+        Book.query.with_entities(Book.title, Book.copies_available)
+        .filter(Book.copies_available > 0)
+        .order_by(Book.title, Book.id),
+        limit
+    )
+    return [tuple(row) for row in rows], more
+
+
+@cache.memoize(timeout=CATALOG_CACHE_TIMEOUT)
+def category_titles(category, limit):
+    """([title, ...] by title, count left out)."""
+    rows, more = limited_rows(
+        Book.query.with_entities(Book.title)
+        .filter(Book.category.ilike(f"%{category}%"))
+        .order_by(Book.title, Book.id),
+        limit
+    )
+    return [title for title, in rows], more
+
+
+def invalidate_catalog_cache():
+    for fn in (total_books, total_users, total_borrow_records,
+               active_borrows, available_book_rows, category_titles):
+        cache.delete_memoized(fn)
+
+
+# =================================================
+# ADMIN DASHBOARD
+# =================================================
+# admin.dashboard_stats() is cached under this key; any blueprint that
+# writes books, users, borrows or recommendations drops it
+DASHBOARD_CACHE_KEY = "admin_dashboard"
+
+
+def invalidate_dashboard():
+    cache.delete(DASHBOARD_CACHE_KEY)
+    invalidate_catalog_cache()
@@ -2,8 +2,35 @@
 # type: ignore
 # pyright: ignore
 
+import orjson
+from flask.json.provider import DefaultJSONProvider
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from flask_caching import Cache
 
-db = SQLAlchemy()
+# Sessions live for one request, so instances are not expired on commit;
+# reading book.id or current_user after a commit needs no reload SELECT
+db = SQLAlchemy(session_options={"expire_on_commit": False})
 login_manager = LoginManager()
+cache = Cache()
+
+
+class ORJSONProvider(DefaultJSONProvider):
+    """
+    jsonify()/request.get_json() backed by orjson. Dates are passed
+    through to Flask's default() so they serialize exactly as before.
+    """
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
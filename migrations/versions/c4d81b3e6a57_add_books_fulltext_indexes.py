@@ -0,0 +1,35 @@
+"""Add books FULLTEXT indexes
+
+Revision ID: c4d81b3e6a57
+Revises: a91c5e07d2f8
+Create Date: 2026-10-15 11:48:20.530261
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d81b3e6a57'
+down_revision = 'a91c5e07d2f8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FULLTEXT is MySQL-only; other backends keep the ILIKE fallback
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    op.create_index('ft_books_title_author', 'books', ['title', 'author'],
+                    unique=False, mysql_prefix='FULLTEXT')
+    op.create_index('ft_books_title_author_category', 'books', ['title', 'author', 'category'],
+                    unique=False, mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'mysql':
+        return
+
+    op.drop_index('ft_books_title_author_category', table_name='books')
+    op.drop_index('ft_books_title_author', table_name='books')
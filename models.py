@@ -4,7 +4,115 @@
 
 from extension import db
 from flask_login import UserMixin
+import re
 from datetime import datetime,date
+from sqlalchemy import and_, or_, literal
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+
+
+# ------------------------
+# SQL helpers
+# ------------------------
+class days_between(FunctionElement):
+    """
+    Whole calendar days from start to end, computed by the database.
+    Usage: days_between(BorrowRecord.due_date, now)
+    """
+    type = db.Integer()
+    name = "days_between"
+    inherit_cache = True
+
+
+@compiles(days_between)
+def _days_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "DATEDIFF(%s, %s)" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+@compiles(days_between, "sqlite")
+def _days_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "CAST(julianday(date(%s)) - julianday(date(%s)) AS INTEGER)" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+@compiles(days_between, "postgresql")
+def _days_between_postgresql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return "(CAST(%s AS DATE) - CAST(%s AS DATE))" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
+
+
+class fulltext_match(FunctionElement):
+    """
+    MATCH ... AGAINST in boolean mode on MySQL, served by a FULLTEXT index
+    over exactly the given columns. Other databases get an ILIKE per column.
+    Build it through search_filter(), which fills in both forms of the term.
+    """
+    name = "fulltext_match"
+    inherit_cache = True
+
+
+@compiles(fulltext_match)
+def _fulltext_match_default(element, compiler, **kw):
+    _, pattern, *columns = list(element.clauses)
+    return "(%s)" % compiler.process(or_(*(c.ilike(pattern) for c in columns)), **kw)
+
+
+@compiles(fulltext_match, "mysql")
+def _fulltext_match_mysql(element, compiler, **kw):
+    against, _, *columns = list(element.clauses)
+    return "MATCH (%s) AGAINST (%s IN BOOLEAN MODE)" % (
+        ", ".join(compiler.process(c, **kw) for c in columns),
+        compiler.process(against, **kw)
+    )
+
+
+# InnoDB does not index words shorter than innodb_ft_min_token_size
+FULLTEXT_MIN_WORD = 3
+
+# InnoDB's default stopword list (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD);
+# these are never indexed, so a required "+the*" term would match nothing
+FULLTEXT_STOPWORDS = frozenset((
+    "a", "about", "an", "are", "as", "at", "be", "by", "com", "de", "en",
+    "for", "from", "how", "i", "in", "is", "it", "la", "of", "on", "or",
+    "that", "the", "this", "to", "was", "what", "when", "where", "who",
+    "will", "with", "und", "www",
+))
+
+
+def search_filter(term, *columns):
+    """
+    Filter for rows where any of columns contains term.
+    Usage: Book.query.filter(search_filter(q, Book.title, Book.author))
+    """
+    words = [
+        w for w in re.findall(r"\w+", term)
+        if w.lower() not in FULLTEXT_STOPWORDS
+    ]
+    if not words or min(len(w) for w in words) < FULLTEXT_MIN_WORD:
+        return or_(*(c.ilike(f"%{term}%") for c in columns))
+
+    # every word required, each as a prefix: "harry pot" -> "+harry* +pot*"
+    against = " ".join(f"+{w}*" for w in words)
+    return fulltext_match(literal(against), literal(f"%{term}%"), *columns)
+
+
+def limited_rows(query, limit):
+    """
+    First limit rows of an ordered query, plus how many were left out.
+    The COUNT only runs when the list was actually cut.
+    Usage: rows, more = limited_rows(query.order_by(...), 50)
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, 0
+    return rows[:limit], query.order_by(None).count() - limit
 
 
 # ------------------------
@@ -26,7 +134,7 @@ class User(UserMixin, db.Model):
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
-    role = db.Column(db.String(20), nullable=False)
+    role = db.Column(db.String(20), nullable=False, index=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
@@ -78,9 +186,26 @@ class Book(db.Model):
             'category',
             name='unique_book_details'
         ),
+        db.Index('ix_books_category', 'category'),
+        db.Index('ix_books_available', 'copies_available'),
+        # FULLTEXT indexes back search_filter(); MATCH needs an index over
+        # exactly the searched columns, hence one per column set.
+        db.Index(
+            'ft_books_title_author', 'title', 'author',
+            mysql_prefix='FULLTEXT'
+        ).ddl_if(dialect='mysql'),
+        db.Index(
+            'ft_books_title_author_category', 'title', 'author', 'category',
+            mysql_prefix='FULLTEXT'
+        ).ddl_if(dialect='mysql'),
     )
 
 
+# Columns the book cards render; description/cover_url stay unloaded
+BOOK_CARD_COLUMNS = (
+    Book.isbn, Book.title, Book.author, Book.rating,
+    Book.category, Book.copies_available
+)
 
 
 # ------------------------
@@ -100,6 +225,22 @@ class BorrowRecord(db.Model):
     returned = db.Column(db.Boolean, default=False)
     fine = db.Column(db.Float, default=0.0)
 
+    __table_args__ = (
+        db.Index('ix_borrow_user_returned_due', 'user_id', 'returned', 'due_date'),
+        db.Index('ix_borrow_returned_due', 'returned', 'due_date'),
+        db.Index('ix_borrow_book_returned', 'book_id', 'returned'),
+    )
+
+    @classmethod
+    def overdue_filter(cls, now):
+        """Not yet returned and past the due date."""
+        return and_(cls.returned.is_(False), cls.due_date < now)
+
+    @classmethod
+    def past_due_filter(cls, today):
+        """Past the due date, whether or not the book came back."""
+        return cls.due_date < today
+
 # ------------------------
 # Book Recommendations
 # ------------------------
@@ -121,3 +262,8 @@ class BookRecommendation(db.Model):
 
     date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_recs_status', 'status'),
+        db.Index('ix_recs_date', 'date'),
+    )
+
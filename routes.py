@@ -3,22 +3,43 @@
 # ================================
 from flask import (
     Flask, render_template, redirect,
-    url_for, Blueprint, request, jsonify, flash
+    url_for, Blueprint, request, jsonify, flash, g
 )
 from flask_login import login_required, current_user
 from models import (
-    Book, BorrowRecord, User, BookRecommendation
+    Book, BorrowRecord, User, BookRecommendation, BOOK_CARD_COLUMNS,
+    search_filter
 )
-from fuzzywuzzy import fuzz
-from sqlalchemy import or_
+from rapidfuzz import fuzz, process
+from sqlalchemy import func, select, case
+from sqlalchemy.orm import joinedload, load_only
 from datetime import date
-from extension import db
+from extension import db, cache, ORJSONProvider
+from config import CACHE_TYPE, CACHE_DEFAULT_TIMEOUT
+from blueprints.chatbot import search_keyword
+from catalog_cache import total_books as cached_total_books
+
+try:
+    import ahocorasick
+except ImportError:  # optional; falls back to plain substring checks
+    ahocorasick = None
 
 # ================================
 # APP SETUP
 # ================================
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 app.secret_key = "supersecretkey"
+app.config["CACHE_TYPE"] = CACHE_TYPE
+app.config["CACHE_DEFAULT_TIMEOUT"] = CACHE_DEFAULT_TIMEOUT
+cache.init_app(app)
+
+
+@app.before_request
+def _set_today():
+    # one app-server date per request, bound into the dashboard and
+    # chatbot queries so neither falls back to the DB's CURRENT_DATE
+    g.today = date.today()
 
 # ================================
 # STUDENT BLUEPRINT
@@ -28,18 +49,19 @@ student = Blueprint("student", __name__, url_prefix="/student")
 @student.route("/dashboard")
 @login_required
 def dashboard():
-    total_books = Book.query.count()
-
-    borrowed_books = BorrowRecord.query.filter_by(
-        user_id=current_user.id,
-        returned=False
-    ).count()
-
-    overdue_books = BorrowRecord.query.filter(
-        BorrowRecord.user_id == current_user.id,
-        BorrowRecord.returned.is_(False),
-        BorrowRecord.due_date < date.today()
-    ).count()
+    # Book total is memoized (dropped on admin writes); the user's two
+    # counters share one query. CASE rather than COUNT(...) FILTER,
+    # which MySQL does not support
+    total_books = cached_total_books()
+
+    borrowed_books, overdue_books = db.session.execute(
+        select(
+            func.count(case((BorrowRecord.returned.is_(False), 1))),
+            func.count(case((BorrowRecord.overdue_filter(g.today), 1)))
+        )
+        .select_from(BorrowRecord)
+        .where(BorrowRecord.user_id == current_user.id)
+    ).one()
 
     return render_template(
         "student_dashboard.html",
@@ -53,13 +75,15 @@ def dashboard():
 def books():
     return render_template(
         "books.html",
-        books=Book.query.all()
+        books=Book.query.options(load_only(*BOOK_CARD_COLUMNS)).all()
     )
 
 @student.route("/borrowed-books")
 @login_required
 def borrowed_books():
-    borrowed = BorrowRecord.query.filter_by(
+    borrowed = BorrowRecord.query.options(
+        joinedload(BorrowRecord.book)
+    ).filter_by(
         user_id=current_user.id
     ).all()
 
@@ -71,13 +95,16 @@ def borrowed_books():
 @student.route("/fines")
 @login_required
 def fines():
-    borrows = BorrowRecord.query.filter_by(
-        user_id=current_user.id
+    fines = BorrowRecord.query.with_entities(
+        BorrowRecord.fine
+    ).filter(
+        BorrowRecord.user_id == current_user.id,
+        BorrowRecord.fine > 0
     ).all()
 
     fines_list = [
-        {"reason": "Overdue Book", "amount": b.fine}
-        for b in borrows if b.fine > 0
+        {"reason": "Overdue Book", "amount": f.fine}
+        for f in fines
     ]
 
     return render_template(
@@ -137,78 +164,148 @@ app.register_blueprint(student)
 # ================================
 # 🤖 CHATBOT API
 # ================================
+# Intent keywords, already lowercase like the incoming message
+SEARCH_KW = ("search", "find book", "book about")
+BORROW_KW = ("my books", "borrowed")
+FINE_KW = ("fine", "penalty")
+
+# Checked in this order; the first intent that matches wins
+INTENTS = (
+    ("search", SEARCH_KW),
+    ("borrowed", BORROW_KW),
+    ("fines", FINE_KW),
+)
+
+# the only intent an anonymous user can act on
+PUBLIC_INTENTS = INTENTS[:1]
+
+FUZZY_THRESHOLD = 70
+
+# indexed by "is overdue"
+DUE_STATUS = ("On time", "Overdue")
+
+
+def _build_automaton():
+    # keyword -> (position in INTENTS, intent); lowest position wins
+    if ahocorasick is None:
+        return None
+
+    automaton = ahocorasick.Automaton()
+    for priority, (intent, keywords) in enumerate(INTENTS):
+        for k in keywords:
+            if not automaton.exists(k):
+                automaton.add_word(k, (priority, intent))
+    automaton.make_automaton()
+    return automaton
+
+
+KEYWORD_AUTOMATON = _build_automaton()
+
+
+def meaning(text, keywords):
+    # best keyword only; None as soon as nothing can reach the cutoff
+    match = process.extractOne(
+        text, keywords,
+        scorer=fuzz.partial_ratio,
+        score_cutoff=FUZZY_THRESHOLD
+    )
+    return match is not None and match[1] > FUZZY_THRESHOLD
+
+
+def detect_intent(text, fuzzy_intents=INTENTS):
+    # exact substrings first: one automaton pass, no edit distance
+    if KEYWORD_AUTOMATON is not None:
+        hits = [value for _, value in KEYWORD_AUTOMATON.iter(text)]
+        if hits:
+            return min(hits)[1]
+    else:
+        for intent, keywords in INTENTS:
+            if any(k in text for k in keywords):
+                return intent
+
+    # fuzzy fallback for typos
+    for intent, keywords in fuzzy_intents:
+        if meaning(text, keywords):
+            return intent
+
+    return None
+
+
 @app.route("/chatbot_api", methods=["POST"])
 def chatbot_api():
     user_msg = request.json.get("message", "").lower().strip()
-
-    def meaning(text, keywords):
-        return any(
-            fuzz.partial_ratio(text, k) > 70
-            for k in keywords
-        )
+    # anonymous users still get the login hint on an exact keyword, but
+    # typos are only fuzzy-scored against intents they can use
+    intent = detect_intent(
+        user_msg,
+        INTENTS if current_user.is_authenticated else PUBLIC_INTENTS
+    )
 
     # ------------------------------------------------------
     # BOOK SEARCH
     # ------------------------------------------------------
-    if meaning(user_msg, ["search", "find book", "book about"]):
-        keyword = user_msg.split()[-1]
-
-        books = Book.query.filter(
-            or_(
-                Book.title.ilike(f"%{keyword}%"),
-                Book.author.ilike(f"%{keyword}%")
-            )
+    if intent == "search":
+        keyword = search_keyword(user_msg)
+        if keyword is None:
+            return jsonify({"reply": "What book are you looking for?"})
+
+        books = Book.query.with_entities(
+            Book.title, Book.author
+        ).filter(
+            search_filter(keyword, Book.title, Book.author)
         ).all()
 
         if not books:
             return jsonify({"reply": f"No books found for '{keyword}'."})
 
-        reply = "<b>Books found:</b><br><br>"
-        for b in books:
-            reply += f"• <b>{b.title}</b> by {b.author}<br>"
+        parts = ["<b>Books found:</b><br><br>"]
+        parts.extend(f"• <b>{b.title}</b> by {b.author}<br>" for b in books)
 
-        return jsonify({"reply": reply})
+        return jsonify({"reply": "".join(parts)})
 
     # ------------------------------------------------------
     # BORROWED BOOKS
     # ------------------------------------------------------
-    if meaning(user_msg, ["my books", "borrowed"]):
+    if intent == "borrowed":
         if not current_user.is_authenticated:
             return jsonify({"reply": "Please log in."})
 
-        borrows = BorrowRecord.query.filter_by(
-            user_id=current_user.id
+        # title, due date and past-due flag all come from one SELECT
+        borrows = db.session.execute(
+            select(
+                Book.title,
+                BorrowRecord.due_date,
+                BorrowRecord.past_due_filter(g.today).label("past_due")
+            )
+            .join(BorrowRecord.book)
+            .where(BorrowRecord.user_id == current_user.id)
         ).all()
 
         if not borrows:
             return jsonify({"reply": "No borrowed books."})
 
-        reply = "<b>Your borrowed books:</b><br><br>"
-        for b in borrows:
-            status = (
-                "Overdue"
-                if b.due_date < date.today()
-                else "On time"
-            )
-            reply += (
-                f"• {b.book.title} — Due: "
-                f"{b.due_date} ({status})<br>"
+        parts = ["<b>Your borrowed books:</b><br><br>"]
+        for title, due_date, past_due in borrows:
+            status = DUE_STATUS[bool(past_due)]
+            parts.append(
+                f"• {title} — Due: "
+                f"{due_date} ({status})<br>"
             )
 
-        return jsonify({"reply": reply})
+        return jsonify({"reply": "".join(parts)})
 
     # ------------------------------------------------------
     # FINES
     # ------------------------------------------------------
-    if meaning(user_msg, ["fine", "penalty"]):
+    if intent == "fines":
         if not current_user.is_authenticated:
             return jsonify({"reply": "Login required."})
 
-        total_fine = sum(
-            b.fine for b in BorrowRecord.query.filter_by(
-                user_id=current_user.id
-            )
-        )
+        total_fine = db.session.query(
+            func.coalesce(func.sum(BorrowRecord.fine), 0)
+        ).filter(
+            BorrowRecord.user_id == current_user.id
+        ).scalar()
 
         return jsonify({
             "reply": f"Your total fine is <b>₹{total_fine}</b>."
@@ -86,10 +86,56 @@ function updateChartsTheme() {
   });
 }
 
+/* =========================
+   REPORT EXPORT
+========================= */
+const sleep = ms => new Promise(resolve => setTimeout(resolve, ms));
+
+// Poll every 1.5 s for at most 15 minutes (the server-side build limit)
+const REPORT_POLL_INTERVAL = 1500;
+const REPORT_POLL_LIMIT = 600;
+
+async function exportReport(event) {
+  event.preventDefault();
+
+  const link = event.currentTarget;
+  // one build per click; ignore clicks while a report is generating
+  if (link.dataset.busy) return;
+  link.dataset.busy = "1";
+
+  const label = link.querySelector("span");
+  const original = label.textContent;
+  label.textContent = "Generating report…";
+
+  try {
+    const job = await (await fetch(link.href, { method: "POST" })).json();
+
+    let state;
+    let attempts = 0;
+    do {
+      await sleep(REPORT_POLL_INTERVAL);
+      state = await (await fetch(job.status_url)).json();
+    } while (state.status === "started" && ++attempts < REPORT_POLL_LIMIT);
+
+    if (state.status === "finished") {
+      window.location = state.download_url;
+    } else {
+      alert("Report generation failed. Please try again.");
+    }
+  } finally {
+    label.textContent = original;
+    delete link.dataset.busy;
+  }
+}
+
 /* =========================
    INIT
 ========================= */
 document.addEventListener("DOMContentLoaded", () => {
   setTheme(localStorage.getItem("theme") || "light");
   if (window.dashboardData) initCharts(window.dashboardData);
+
+  document.querySelectorAll("[data-report-export]").forEach(link =>
+    link.addEventListener("click", exportReport)
+  );
 });
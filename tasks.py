@@ -0,0 +1,376 @@
+# tasks.py
+# type: ignore
+# pyright: ignore
+
+import os
+import time
+import uuid
+import hashlib
+import tempfile
+from http.client import HTTPException
+from itertools import islice
+from xml.sax.saxutils import escape
+from urllib.request import urlopen
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import select
+
+from config import REPORTS_FOLDER
+from extension import db
+from models import User, Book, BorrowRecord, days_between
+
+# PDF
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+
+
+# Report builds and cover downloads run here, off the request workers
+executor = ThreadPoolExecutor(max_workers=2)
+
+# Finished reports are removed after this many seconds
+REPORT_TTL = 60 * 60
+
+# A build still running after this many seconds is treated as failed;
+# its worker process was most likely recycled mid-build
+REPORT_BUILD_LIMIT = 15 * 60
+
+# Overdue fine charged per day
+FINE_PER_DAY = 5
+
+# Rows fetched per batch while streaming report sections
+REPORT_BATCH_SIZE = 500
+
+# Rows per PDF table; Platypus re-splits a table on every page, so one
+# huge table costs far more than many small ones
+TABLE_CHUNK_ROWS = 100
+
+# Remote cover downloads
+COVER_TIMEOUT = 5
+COVER_CHUNK_SIZE = 1024 * 1024
+
+
+# =================================================
+# JOB FILES
+# =================================================
+def report_path(job_id, suffix=".pdf"):
+    return os.path.join(REPORTS_FOLDER, f"{job_id}{suffix}")
+
+
+def report_status(job_id):
+    """
+    Job state is kept on disk so any worker process can answer:
+    <id>.part while building, <id>.pdf when done, <id>.failed on error.
+    A .part older than REPORT_BUILD_LIMIT counts as failed.
+    """
+    if os.path.exists(report_path(job_id)):
+        return "finished"
+    if os.path.exists(report_path(job_id, ".failed")):
+        return "failed"
+    try:
+        started = os.path.getmtime(report_path(job_id, ".part"))
+    except OSError:
+        # the build may have finished since the first check
+        return "finished" if os.path.exists(report_path(job_id)) else None
+    if time.time() - started > REPORT_BUILD_LIMIT:
+        return "failed"
+    return "started"
+
+
+def _prune_old_reports():
+    cutoff = time.time() - REPORT_TTL
+    for name in os.listdir(REPORTS_FOLDER):
+        path = os.path.join(REPORTS_FOLDER, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+# =================================================
+# FULL REPORT JOB
+# =================================================
+def enqueue_full_report(app):
+    _prune_old_reports()
+
+    job_id = str(uuid.uuid4())
+    open(report_path(job_id, ".part"), "wb").close()
+    executor.submit(_run_full_report, app, job_id)
+    return job_id
+
+
+def _run_full_report(app, job_id):
+    with app.app_context():
+        try:
+            build_full_report(job_id)
+        except Exception:
+            app.logger.exception("Full report %s failed", job_id)
+            open(report_path(job_id, ".failed"), "wb").close()
+        finally:
+            db.session.remove()
+
+
+def build_full_report(job_id):
+    part = report_path(job_id, ".part")
+    with open(part, "wb") as fh:
+        write_full_report(fh)
+    os.replace(part, report_path(job_id))
+
+
+def _stream(stmt):
+    """
+    Iterate rows in batches instead of loading the whole table.
+
+    The statement must not trigger loader queries (selectinload etc.):
+    on MySQL the server-side cursor shares the connection, and a second
+    query discards the rest of the streamed rows.
+    """
+    return db.session.execute(
+        stmt.execution_options(
+            stream_results=True, yield_per=REPORT_BATCH_SIZE
+        )
+    )
+
+
+# Shared look for every section table
+TABLE_STYLE = TableStyle([
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("GRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    ("VALIGN", (0, 0), (-1, -1), "TOP"),
+])
+
+# Free-text cells; plain strings never wrap in fixed-width columns
+CELL_STYLE = ParagraphStyle(
+    "ReportCell", fontName="Helvetica", fontSize=8, leading=10
+)
+
+
+def _text(value):
+    """
+    Free text (titles, names, emails) as a Paragraph so it wraps inside
+    its column instead of running into the next one.
+    """
+    return Paragraph(escape(value or ""), CELL_STYLE)
+
+
+def _section_tables(doc, header, weights, rows):
+    """
+    Tables of at most TABLE_CHUNK_ROWS rows each, instead of a
+    Paragraph + Spacer per record. Column widths come from weights so
+    every chunk lines up and ReportLab can skip auto-sizing.
+    """
+    total = sum(weights)
+    col_widths = [doc.width * w / total for w in weights]
+
+    rows = iter(rows)
+    tables = []
+    while chunk := list(islice(rows, TABLE_CHUNK_ROWS)):
+        tables.append(Table(
+            [header, *chunk],
+            colWidths=col_widths,
+            style=TABLE_STYLE,
+            repeatRows=1
+        ))
+    return tables
+
+
+def _day(value):
+    """
+    YYYY-MM-DD for a DATE or DATETIME column (the schema has both), or
+    blank when unset.
+    """
+    return f"{value:%Y-%m-%d}" if value else ""
+
+
+def overdue_fines_stmt(now):
+    """
+    (username, title, days_overdue, fine) per overdue record; days and
+    fine are computed by the database.
+    """
+    days_overdue = days_between(BorrowRecord.due_date, now)
+    return (
+        select(
+            User.username,
+            Book.title,
+            days_overdue.label("days_overdue"),
+            (days_overdue * FINE_PER_DAY).label("fine")
+        )
+        .select_from(BorrowRecord)
+        .join(User, User.id == BorrowRecord.user_id)
+        .join(Book, Book.id == BorrowRecord.book_id)
+        .where(BorrowRecord.overdue_filter(now))
+    )
+
+
+def write_full_report(output):
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A4,
+        rightMargin=30,
+        leftMargin=30,
+        topMargin=30,
+        bottomMargin=30
+    )
+
+    styles = getSampleStyleSheet()
+    title = ParagraphStyle(
+        "ReportTitle", parent=styles["Title"], spaceAfter=20
+    )
+    heading = ParagraphStyle(
+        "ReportSection", parent=styles["Heading2"],
+        spaceBefore=20, spaceAfter=10
+    )
+    now = datetime.utcnow()
+    elements = [Paragraph("📊 Library Full Detailed Report", title)]
+
+    # ---------------- USERS ----------------
+    elements.append(Paragraph("👥 Users", heading))
+    elements.extend(_section_tables(
+        doc,
+        ["Username", "Email", "Role", "Joined"],
+        [2, 3, 1, 1],
+        (
+            [_text(u.username), _text(u.email), u.role,
+             str(u.created_at.date())]
+            for u in _stream(select(User).order_by(User.username)).scalars()
+        )
+    ))
+
+    # ---------------- BOOKS ----------------
+    elements.append(Paragraph("📚 Books", heading))
+    elements.extend(_section_tables(
+        doc,
+        ["Title", "Author", "Publisher", "Year", "Category",
+         "Total", "Available"],
+        [4, 2.5, 2.5, 1, 2, 1, 1.3],
+        (
+            [_text(b.title), _text(b.author), _text(b.publisher), b.year,
+             _text(b.category), b.copies_total, b.copies_available]
+            for b in _stream(select(Book).order_by(Book.title)).scalars()
+        )
+    ))
+
+    # ---------------- BORROWED ----------------
+    elements.append(Paragraph("📖 Borrowed Books", heading))
+
+    borrowed_rows = []
+    for title, username, borrow_date, due_date, returned, overdue in _stream(
+        select(
+            Book.title,
+            User.username,
+            BorrowRecord.borrow_date,
+            BorrowRecord.due_date,
+            BorrowRecord.returned,
+            BorrowRecord.overdue_filter(now).label("overdue")
+        )
+        .select_from(BorrowRecord)
+        .join(Book, Book.id == BorrowRecord.book_id)
+        .join(User, User.id == BorrowRecord.user_id)
+        .order_by(BorrowRecord.borrow_date.desc())
+    ):
+        status = "Returned" if returned else "Not Returned"
+        borrowed_rows.append([
+            _text(title),
+            _text(username),
+            _day(borrow_date),
+            _day(due_date),
+            f"{status} (OVERDUE)" if overdue else status
+        ])
+
+    elements.extend(_section_tables(
+        doc,
+        ["Book", "User", "Borrowed On", "Due Date", "Status"],
+        [4, 2, 1.5, 1.5, 2.5],
+        borrowed_rows
+    ))
+
+    # ---------------- FINES ----------------
+    elements.append(Paragraph("💰 Fines / Overdue List", heading))
+
+    fine_rows = [
+        [_text(username), _text(title), days, f"₹{fine}"]
+        for username, title, days, fine in db.session.execute(
+            overdue_fines_stmt(now)
+        )
+    ]
+
+    if not fine_rows:
+        elements.append(
+            Paragraph("No overdue fines 🎉", styles["Normal"])
+        )
+    else:
+        elements.extend(_section_tables(
+            doc,
+            ["User", "Book", "Days Overdue", "Fine Amount"],
+            [2, 4, 1.5, 1.5],
+            fine_rows
+        ))
+
+    doc.build(elements)
+
+
+# =================================================
+# COVER MIRROR JOB
+# =================================================
+def enqueue_cover_mirror(app, book_id, url):
+    executor.submit(_run_cover_mirror, app, book_id, url)
+
+
+def _run_cover_mirror(app, book_id, url):
+    with app.app_context():
+        try:
+            mirror_cover(book_id, url)
+        except Exception:
+            app.logger.exception("Mirroring cover for book %s failed", book_id)
+        finally:
+            db.session.remove()
+
+
+def mirror_cover(book_id, url):
+    """
+    Downloads a remote cover into UPLOAD_FOLDER (content-addressed, like
+    uploads) and points the book at the local copy. On any download
+    error the remote URL is kept as a fallback.
+    """
+    folder = current_app.config["UPLOAD_FOLDER"]
+    limit = current_app.config["MAX_CONTENT_LENGTH"]
+    digest = hashlib.blake2b(digest_size=16)
+
+    fd, part = tempfile.mkstemp(dir=folder, suffix=".part")
+    try:
+        size = 0
+        # wrap fd first so it is closed even when urlopen raises
+        with os.fdopen(fd, "wb") as dst, \
+                urlopen(url, timeout=COVER_TIMEOUT) as resp:
+            for chunk in iter(lambda: resp.read(COVER_CHUNK_SIZE), b""):
+                size += len(chunk)
+                if size > limit:
+                    raise OSError(f"Cover larger than {limit} bytes")
+                digest.update(chunk)
+                dst.write(chunk)
+    except (OSError, HTTPException):
+        # 404s, timeouts and truncated bodies: keep the remote URL
+        os.remove(part)
+        return
+    except BaseException:
+        os.remove(part)
+        raise
+
+    filename = f"{digest.hexdigest()}.jpg"
+    path = os.path.join(folder, filename)
+    if os.path.exists(path):
+        os.remove(part)
+    else:
+        os.replace(part, path)
+
+    book = db.session.get(Book, book_id)
+    # Skip if the cover was changed while we were downloading
+    if book and book.cover_url == url:
+        book.cover_url = f"/static/uploads/{filename}"
+        db.session.commit()